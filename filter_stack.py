@@ -0,0 +1,101 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class FilterStack:
+    '''
+    Treats several HSFW and IFW wheels mounted in series as one logical filter wheel.
+
+    Filter combinations are given as one filter name (or position) per wheel, in the order the wheels were passed in.
+    Use None to leave a wheel where it is. All wheels are moved at the same time, so a combination change
+    takes as long as the slowest wheel instead of the sum of all moves.
+    '''
+
+    def __init__(self, wheels, timeout=30):
+        if len(wheels) < 1:
+            raise Exception("A filter stack needs at least one wheel")
+        self.wheels = list(wheels)
+        self.timeout = timeout
+        self._filter_names = None
+
+    def get_filter_names(self):
+        '''Returns the filter names of every wheel. The names are cached, use refresh_filter_names() after renaming filters.'''
+        if self._filter_names is None:
+            self.refresh_filter_names()
+        return self._filter_names
+
+    def refresh_filter_names(self):
+        '''Reads the filter names of every wheel again.'''
+        self._filter_names = [list(wheel.get_filter_names()) for wheel in self.wheels]
+        return self._filter_names
+
+    def resolve(self, names):
+        '''Returns the positions for a combination of filter names, one per wheel.'''
+        if len(names) != len(self.wheels):
+            raise Exception("You must specify {} filters, one for each wheel in the stack.".format(len(self.wheels)))
+
+        positions = []
+        for index, name in enumerate(names):
+            if name is None or isinstance(name, int):
+                positions.append(name)
+                continue
+
+            wheel_names = [n.strip() for n in self.get_filter_names()[index]]
+            wanted = name.strip()
+            if wanted in wheel_names:
+                positions.append(wheel_names.index(wanted) + 1)
+                continue
+
+            folded = [n.upper() for n in wheel_names]
+            if wanted.upper() in folded:
+                positions.append(folded.index(wanted.upper()) + 1)
+                continue
+
+            raise Exception("Filter {} was not found on wheel {} ({}). Available filters: {}".format(
+                name, index + 1, self.wheels[index].serial_number, ", ".join(wheel_names)))
+        return positions
+
+    def select(self, names):
+        '''Moves every wheel to the given combination of filter names and blocks until all wheels are in place.'''
+        self.move_to_filters(self.resolve(names))
+
+    def move_to_filters(self, positions):
+        '''Moves every wheel to the given positions at the same time and blocks until the slowest wheel is in place.'''
+        if len(positions) != len(self.wheels):
+            raise Exception("You must specify {} positions, one for each wheel in the stack.".format(len(self.wheels)))
+
+        moves = [(wheel, position) for wheel, position in zip(self.wheels, positions) if position is not None]
+        if not moves:
+            return
+
+        with ThreadPoolExecutor(max_workers=len(moves)) as executor:
+            futures = [executor.submit(self._move_wheel, wheel, position) for wheel, position in moves]
+
+        errors = [future.exception() for future in futures if future.exception() is not None]
+        if errors:
+            raise errors[0]
+
+    def _move_wheel(self, wheel, position):
+        if wheel.get_current_filter() == position:
+            return
+
+        wheel.move_to_filter(position)
+
+        deadline = time.monotonic() + self.timeout
+        while wheel.is_moving:
+            if time.monotonic() > deadline:
+                raise Exception("Timed out waiting for wheel {} to reach filter {}".format(wheel.serial_number, position))
+            time.sleep(.01)
+
+        current = wheel.get_current_filter()
+        if current != position:
+            raise Exception("Wheel {} stopped at filter {} instead of {}".format(wheel.serial_number, current, position))
+
+    def get_current_filters(self):
+        '''Returns the current position of every wheel.'''
+        return [wheel.get_current_filter() for wheel in self.wheels]
+
+    def get_current_filter_names(self):
+        '''Returns the current filter name of every wheel.'''
+        names = self.get_filter_names()
+        return [names[index][position - 1] for index, position in enumerate(self.get_current_filters())]
@@ -0,0 +1,351 @@
+import argparse
+import glob
+import json
+import os
+import secrets
+import shlex
+import sys
+import time
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Listener
+
+import wheels
+from fw_timing import DEFAULT_TIMINGS_FILE, OperationTimings
+
+SESSION_DIR = os.path.join(os.path.expanduser('~'), '.optec_fw_sessions')
+
+USAGE = '''Commands:
+  list                      List the attached wheels
+  status                    Show the position and state of the wheel
+  move <position|name>      Move to a filter and wait until the move is complete
+  home                      Home the wheel and wait until it is homed
+  names [get]               Show the filter names of the current wheel
+  names set <name>...       Set the filter names of the current wheel
+  clear-error               Clear the error state (HSFW only)
+  batch                     Run one command per line from stdin over one connection
+  serve                     Keep the wheel open and serve later invocations
+  stop                      Stop a running serve session
+
+Every command prints one JSON object per line.'''
+
+
+def _wait(wheel, timeout=30):
+    deadline = time.monotonic() + timeout
+    while wheel.is_moving or wheel.is_homing:
+        if time.monotonic() > deadline:
+            raise Exception("Timed out waiting for the wheel to stop")
+        time.sleep(.01)
+
+    if hasattr(wheel, 'get_hsfw_status') and wheel.error_state != 0:
+        raise Exception(wheel.get_error_text(wheel.error_state))
+
+
+def _filter_names(wheel):
+    return [name.strip() for name in wheel.get_filter_names()]
+
+
+def _status(wheel):
+    if hasattr(wheel, 'get_hsfw_status'):
+        raw = wheel.get_hsfw_status()
+        status = {
+            "is_homed": raw["is_homed"],
+            "is_homing": raw["is_homing"],
+            "is_moving": raw["is_moving"],
+            "position": raw["position"],
+            "error_state": raw["error_state"],
+            "error_text": wheel.get_error_text(raw["error_state"]),
+        }
+    else:
+        status = {
+            "is_homed": wheel.is_homed,
+            "is_homing": wheel.is_homing,
+            "is_moving": wheel.is_moving,
+            "position": wheel.get_current_filter(),
+        }
+
+    status["serial_number"] = wheel.serial_number
+    status["firmware_version"] = wheel.firmware_version
+    status["wheel_id"] = wheel.get_wheel_id()
+    if status["position"] >= 1:
+        status["filter_name"] = wheel.get_filter_name(status["position"]).strip()
+    return status
+
+
+def _move(wheel, target):
+    if target.isdigit():
+        position = int(target)
+    else:
+        names = [name.upper() for name in _filter_names(wheel)]
+        if target.upper() not in names:
+            raise Exception("Filter {} was not found. Available filters: {}".format(target, ", ".join(_filter_names(wheel))))
+        position = names.index(target.upper()) + 1
+
+    wheel.move_to_filter(position)
+    _wait(wheel)
+    current = wheel.get_current_filter()
+    if current != position:
+        raise Exception("The wheel stopped at filter {} instead of {}".format(current, position))
+    return {"position": current}
+
+
+def _home(wheel):
+    wheel.home()
+    _wait(wheel)
+    return {"is_homed": wheel.is_homed, "position": wheel.get_current_filter()}
+
+
+def _names(wheel, args):
+    if len(args) == 0 or args == ['get']:
+        return {"wheel_id": wheel.get_wheel_id(), "names": _filter_names(wheel)}
+    if args[0] == 'set':
+        wheel.set_filter_names(args[1:])
+        return {"wheel_id": wheel.get_wheel_id(), "names": _filter_names(wheel)}
+    raise Exception("Usage: names [get] | names set <name>...")
+
+
+def _clear_error(wheel):
+    if not hasattr(wheel, 'clear_error'):
+        raise Exception("clear-error is only supported by the HSFW")
+    wheel.clear_error()
+    return {"error_state": wheel.error_state}
+
+
+def _list():
+    return [{"backend": backend, "identifier": identifier} for backend, identifier in wheels.list_wheels()]
+
+
+def run_command(wheel, args):
+    '''Runs one command against an open wheel and returns the JSON-ready result.'''
+    if len(args) == 0:
+        raise Exception("No command given")
+
+    command, args = args[0], args[1:]
+    if command == 'list':
+        return _list()
+    if wheel is None:
+        raise Exception("Use --wheel to select a wheel for {}".format(command))
+    if command == 'status':
+        return _status(wheel)
+    if command == 'move':
+        if len(args) != 1:
+            raise Exception("Usage: move <position|name>")
+        return _move(wheel, args[0])
+    if command == 'home':
+        return _home(wheel)
+    if command == 'names':
+        return _names(wheel, args)
+    if command == 'clear-error':
+        return _clear_error(wheel)
+    raise Exception("Unknown command: {}".format(" ".join([command] + args)))
+
+
+def execute(wheel, args):
+    '''Runs a command and wraps the result or error in a reply dict.'''
+    reply = {"command": " ".join(args), "ok": True}
+    try:
+        reply["result"] = run_command(wheel, args)
+    except Exception as e:
+        reply["ok"] = False
+        reply["error"] = str(e)
+    return reply
+
+
+def _print(reply):
+    print(json.dumps(reply), flush=True)
+
+
+def _batch_lines():
+    for line in sys.stdin:
+        args = shlex.split(line, comments=True)
+        if args:
+            yield args
+
+
+def _wheel_key(options):
+    '''Names the selected wheel the same way however it was given, for example by COM port or USB serial number.'''
+    try:
+        backend, identifier = wheels.resolve_wheel(options.wheel, options.backend)
+    except Exception:
+        backend, identifier = options.backend, options.wheel
+    return "{}-{}".format(backend, identifier)
+
+
+def _session_path(key):
+    name = "".join(c if c.isalnum() or c in '-_.' else '_' for c in key)
+    return os.path.join(SESSION_DIR, name + '.json')
+
+
+def _read_session(path):
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _connect(path):
+    '''Connects to the serve session recorded in path, or returns None if it is not running.'''
+    session = _read_session(path)
+    if session is None:
+        return None
+    try:
+        return Client(tuple(session["address"]), authkey=bytes.fromhex(session["authkey"]))
+    except (OSError, EOFError, AuthenticationError, KeyError, TypeError, ValueError):
+        return None
+
+
+def _attach(options):
+    '''
+    Connects to the running serve session for the selected wheel, or to the only running session if no wheel is selected.
+    Returns None if there is none. Raises if --no-session would open a wheel that a session holds.
+    '''
+    if options.wheel is None:
+        if options.no_session:
+            return None
+        conns = [conn for conn in map(_connect, glob.glob(os.path.join(SESSION_DIR, '*.json'))) if conn is not None]
+        if len(conns) > 1:
+            for conn in conns:
+                conn.close()
+            raise Exception("Several serve sessions are running. Use --wheel to select one.")
+        return conns[0] if conns else None
+
+    conn = _connect(_session_path(_wheel_key(options)))
+    if conn is not None and options.no_session:
+        conn.close()
+        raise Exception("The wheel is held by a running serve session. Stop the session or run without --no-session.")
+    return conn
+
+
+def _serve_connection(wheel, conn):
+    '''Answers commands from one attached client. Returns False once the client asks the session to stop.'''
+    while True:
+        try:
+            args = conn.recv()
+            if args == ['stop']:
+                conn.send({"command": "stop", "ok": True, "result": None})
+                return False
+            conn.send(execute(wheel, args))
+        except (EOFError, OSError):
+            return True
+
+
+def _send_to_session(conn, commands):
+    '''Runs commands on an attached serve session and prints the replies. Returns the exit code.'''
+    ok = True
+    for args in commands:
+        try:
+            conn.send(args)
+            reply = conn.recv()
+        except (EOFError, OSError) as e:
+            _print({"command": " ".join(args), "ok": False, "error": "Lost the connection to the serve session: {}".format(e)})
+            return 1
+        ok = ok and reply["ok"]
+        _print(reply)
+        if args == ['stop']:
+            break
+    return 0 if ok else 1
+
+
+def _serve(wheel, options, path):
+    authkey = secrets.token_bytes(16)
+    listener = Listener(('localhost', options.port), authkey=authkey)
+    session = {
+        "wheel": options.wheel,
+        "address": list(listener.address),
+        "authkey": authkey.hex(),
+        "pid": os.getpid(),
+    }
+    os.makedirs(SESSION_DIR, exist_ok=True)
+    with os.fdopen(os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'w') as f:
+        json.dump(session, f)
+    _print({"command": "serve", "ok": True, "result": session["address"]})
+
+    try:
+        running = True
+        while running:
+            try:
+                conn = listener.accept()
+            except Exception:
+                continue
+            with conn:
+                running = _serve_connection(wheel, conn)
+    finally:
+        listener.close()
+        if _read_session(path) == session:
+            os.remove(path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='fw', description='Control Optec HSFW and IFW filter wheels.', epilog=USAGE,
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--wheel', help='HSFW serial number or IFW COM port')
+    parser.add_argument('--backend', help='Wheel backend, detected from --wheel by default')
+    parser.add_argument('--no-session', action='store_true', help='Open the wheel directly even if a serve session is running')
+    parser.add_argument('--port', type=int, default=0, help='TCP port for serve (default: any free port)')
+    parser.add_argument('--timings', default=DEFAULT_TIMINGS_FILE,
+                        help='File that keeps IFW home and move timings between runs (default: %(default)s, "none" to disable)')
+    parser.add_argument('command', nargs=argparse.REMAINDER)
+    options = parser.parse_args(argv)
+
+    if not options.command:
+        parser.print_help()
+        return 2
+
+    command = options.command[0]
+    if command not in ('serve', 'list'):
+        try:
+            conn = _attach(options)
+        except Exception as e:
+            _print({"command": " ".join(options.command), "ok": False, "error": str(e)})
+            return 2
+        if conn is not None:
+            with conn:
+                return _send_to_session(conn, _batch_lines() if command == 'batch' else [options.command])
+
+    if command == 'stop':
+        _print({"command": "stop", "ok": False, "error": "No serve session is running"})
+        return 1
+
+    if command == 'list':
+        reply = execute(None, ['list'])
+        _print(reply)
+        return 0 if reply["ok"] else 1
+
+    if options.wheel is None:
+        _print({"command": " ".join(options.command), "ok": False, "error": "Use --wheel to select a wheel"})
+        return 2
+
+    session_path = _session_path(_wheel_key(options))
+    if command == 'serve':
+        conn = _connect(session_path)
+        if conn is not None:
+            conn.close()
+            _print({"command": "serve", "ok": False, "error": "A serve session is already running for this wheel"})
+            return 1
+
+    try:
+        timings_file = None if options.timings.lower() == 'none' else options.timings
+        wheel = wheels.open_wheel(options.wheel, options.backend, timings=OperationTimings(timings_file))
+    except Exception as e:
+        _print({"command": " ".join(options.command), "ok": False, "error": str(e)})
+        return 1
+
+    try:
+        if command == 'serve':
+            _serve(wheel, options, session_path)
+            return 0
+
+        commands = _batch_lines() if command == 'batch' else [options.command]
+        ok = True
+        for args in commands:
+            reply = execute(wheel, args)
+            ok = ok and reply["ok"]
+            _print(reply)
+        return 0 if ok else 1
+    finally:
+        wheel.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
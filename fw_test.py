@@ -1,5 +1,5 @@
-import ifw 
-import hsfw
+import wheels
+import fw_timing
 import time
 import copy
 
@@ -56,11 +56,12 @@ def run_wheel_tests(wheel):
     wheel.close()
 
 def TestHSFW():
-    for n in hsfw.HSFW.get_serial_numbers():
+    serial_numbers = [identifier for backend, identifier in wheels.list_wheels() if backend == 'hsfw']
+    for n in serial_numbers:
         print(n)
 
     #Use the first HSFW
-    wheel = hsfw.HSFW(hsfw.HSFW.get_serial_numbers()[0])
+    wheel = wheels.open_wheel(serial_numbers[0], 'hsfw')
     print(wheel.get_hsfw_status())
     print(wheel.get_hsfw_description())
 
@@ -72,7 +73,7 @@ def TestHSFW():
 
 def TestIFW(comport):
     print("testing IFW")
-    wheel = ifw.IFW(comport)
+    wheel = wheels.open_wheel(comport, timings=fw_timing.OperationTimings(fw_timing.DEFAULT_TIMINGS_FILE))
     print(wheel.model)
     run_wheel_tests(wheel)  
   
@@ -0,0 +1,136 @@
+import atexit
+import json
+import os
+import threading
+import time
+import weakref
+
+DEFAULT_TIMINGS_FILE = os.path.join(os.path.expanduser('~'), '.optec_fw_timings.json')
+
+_persistent_timings = weakref.WeakSet()
+
+
+@atexit.register
+def _flush_at_exit():
+    for timings in list(_persistent_timings):
+        timings.flush()
+
+
+class OperationTimings:
+    '''
+    Keeps a history of how long wheel operations take, per device and operation.
+
+    Durations can be recorded per unit of work, for example seconds per filter slot travelled,
+    so that operations of different lengths share one history.
+    timeout() derives a timeout from the slowest recent run plus a safety margin so that a
+    stuck wheel is reported as soon as the expected completion time is clearly exceeded.
+    The history is kept in memory unless a path is given, for example DEFAULT_TIMINGS_FILE, in which case it is
+    saved to that JSON file so it survives restarts. Saves are batched to at most one every save_interval seconds,
+    plus one at flush() and at exit.
+    '''
+
+    def __init__(self, path=None, margin=1.5, padding=0.5, min_samples=3, max_samples=20, save_interval=30.0):
+        self.path = path
+        self.margin = margin
+        self.padding = padding
+        self.min_samples = min_samples
+        self.max_samples = max_samples
+        self.save_interval = save_interval
+        self._lock = threading.Lock()
+        self._history = None
+        self._dirty = False
+        self._last_save = time.monotonic()
+        if path is not None:
+            _persistent_timings.add(self)
+
+    def _load(self):
+        if self._history is not None:
+            return self._history
+
+        self._history = {}
+        if self.path is not None and os.path.exists(self.path):
+            try:
+                with open(self.path, 'r') as f:
+                    self._history = self._validate(json.load(f))
+            except (OSError, ValueError):
+                self._history = {}
+        return self._history
+
+    def _validate(self, data):
+        '''Keeps only the well-formed {device: {operation: [seconds, ...]}} entries of a loaded file.'''
+        history = {}
+        if not isinstance(data, dict):
+            return history
+        for device, operations in data.items():
+            if not isinstance(operations, dict):
+                continue
+            for operation, samples in operations.items():
+                if not isinstance(samples, list):
+                    continue
+                samples = [sample for sample in samples
+                           if isinstance(sample, (int, float)) and not isinstance(sample, bool) and sample > 0]
+                if samples:
+                    history.setdefault(device, {})[operation] = samples[-self.max_samples:]
+        return history
+
+    def _save(self):
+        self._dirty = False
+        self._last_save = time.monotonic()
+        if self.path is None:
+            return
+        tmp_path = self.path + '.tmp'
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(self._history, f)
+            os.replace(tmp_path, self.path)
+        except OSError:
+            pass
+
+    def get_samples(self, device, operation):
+        '''Returns the recorded durations per unit in seconds for the device and operation.'''
+        with self._lock:
+            return list(self._load().get(device, {}).get(operation, []))
+
+    def record(self, device, operation, duration, units=1):
+        '''Records the duration in seconds of a successful operation that covered units of work.'''
+        if units < 1:
+            return
+        with self._lock:
+            samples = self._load().setdefault(device, {}).setdefault(operation, [])
+            samples.append(round(duration / units, 3))
+            del samples[:-self.max_samples]
+            self._dirty = True
+            if self.path is not None and time.monotonic() - self._last_save >= self.save_interval:
+                self._save()
+
+    def flush(self):
+        '''Saves any timings recorded since the last save.'''
+        with self._lock:
+            if self._dirty:
+                self._save()
+
+    def expected(self, device, operation, units=1):
+        '''Returns the expected duration of the operation over units of work, or None if there is not enough history.'''
+        samples = self.get_samples(device, operation)
+        if len(samples) < self.min_samples:
+            return None
+        return max(samples) * units
+
+    def timeout(self, device, operation, default, units=1):
+        '''
+        Returns the timeout to use for the operation over units of work.
+        Falls back to default until enough history is recorded and never exceeds default.
+        '''
+        expected = self.expected(device, operation, units)
+        if expected is None:
+            return default
+        return min(default, expected * self.margin + self.padding)
+
+    def clear(self, device=None):
+        '''Forgets the history for one device or for all devices.'''
+        with self._lock:
+            if device is None:
+                self._history = {}
+            else:
+                self._load().pop(device, None)
+            self._save()
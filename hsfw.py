@@ -1,8 +1,111 @@
 import hid
+import queue
+import threading
+import time
 
 REPORT_TRUE = 255
 REPORT_FALSE = 0
 
+VENDOR_ID = 0x10c4
+PRODUCT_ID = 0x82cd
+
+STATUS_REPORT_ID = 10
+STATUS_EVENT_KEYS = ('is_homed', 'is_homing', 'is_moving', 'position', 'error_state')
+
+FEATURE_REPORT_LENGTH = 14
+MOVE_REPORT_ID = 20
+HOME_REPORT_ID = 21
+FLASH_OPS_REPORT_ID = 22
+
+FLASH_UPDATE_FILTER_NAME = 2
+FLASH_READ_FILTER_NAME = 3
+FLASH_READ_WHEEL_NAME = 5
+
+
+class HSFWReportError(Exception):
+    '''Raised when the HSFW rejects a feature report or answers it unexpectedly.'''
+
+    def __init__(self, report, detail):
+        self.report = report
+        self.detail = detail
+        super().__init__("Failed to {} ({} report {}): {}".format(
+            report.name, report.label, report.report_id, detail))
+
+
+class FeatureReport:
+    '''
+    Describes one HSFW feature report request.
+
+    The request bytes are built from a template made once per report, with the values passed to encode()
+    written at the offsets in fields. A bytes value fills consecutive offsets.
+    Command reports (no flash operation) are answered with an accepted flag and then an error flag.
+    Flash operation reports are answered twice with the operation, wheel ID and position echoed back.
+    '''
+
+    def __init__(self, name, label, report_id, operation=None, fields=()):
+        self.name = name
+        self.label = label
+        self.report_id = report_id
+        self.operation = operation
+        self.fields = fields
+
+        template = bytearray(FEATURE_REPORT_LENGTH)
+        template[0] = report_id
+        if operation is not None:
+            template[1] = operation
+        self.template = bytes(template)
+
+    def encode(self, *values):
+        '''Returns the request bytes for the given field values.'''
+        request = bytearray(self.template)
+        for offset, value in zip(self.fields, values):
+            if isinstance(value, (bytes, bytearray)):
+                request[offset:offset + len(value)] = value
+            else:
+                request[offset] = value
+        return request
+
+    def validate(self, request, first, second):
+        '''Checks both responses to a request and raises HSFWReportError if they are wrong.'''
+        if not first or not second or len(first) < 5 or len(second) < 5:
+            raise HSFWReportError(self, "no response")
+
+        if first[0] != self.report_id:
+            raise HSFWReportError(self, "response was for report {}".format(first[0]))
+
+        if self.operation is None:
+            if first[1] != REPORT_TRUE:
+                raise HSFWReportError(self, "the command was not accepted")
+            if second[1] != REPORT_FALSE:
+                raise HSFWReportError(self, "the wheel reported an error")
+            return
+
+        expected = (self.operation, 0, request[2], request[3])
+        for offset, value in enumerate(expected, 1):
+            if first[offset] != second[offset] or first[offset] != value:
+                raise HSFWReportError(self, "byte {} was {} instead of {}".format(offset, first[offset], value))
+
+
+MOVE_REPORT = FeatureReport("move", "MOVE", MOVE_REPORT_ID, fields=(1,))
+HOME_REPORT = FeatureReport("home", "HOME", HOME_REPORT_ID)
+UPDATE_FILTER_NAME_REPORT = FeatureReport(
+    "set filter name", "FLASH_UPDATE_FILTER_NAME", FLASH_OPS_REPORT_ID, FLASH_UPDATE_FILTER_NAME, fields=(2, 3, 4))
+READ_FILTER_NAME_REPORT = FeatureReport(
+    "get filter name", "FLASH_READ_FILTER_NAME", FLASH_OPS_REPORT_ID, FLASH_READ_FILTER_NAME, fields=(2, 3))
+READ_WHEEL_NAME_REPORT = FeatureReport(
+    "get wheel name", "FLASH_READ_WHEEL_NAME", FLASH_OPS_REPORT_ID, FLASH_READ_WHEEL_NAME, fields=(2,))
+
+
+def _parse_status(res):
+    return {
+        "report_id": res[0],
+        "is_homed": res[1] == REPORT_TRUE,
+        "is_homing": res[2] == REPORT_TRUE,
+        "is_moving": res[3] == REPORT_TRUE,
+        "position": res[4],
+        "error_state": res[5]
+    }
+
 
 class HSFW:
     '''
@@ -10,15 +113,20 @@ class HSFW:
 
     Use the get_serial_numbers method to get all attached HSFW Serial Number. 
     open() can be used to open either 1. the only wheel attached to the system or 2. the wheel with the given serial number.
+    If the USB connection drops, the wheel is reopened by serial number and status and name reads are retried.
+    Set auto_reconnect to False to disable this.
     '''
     serial_number = '*********'
     firmware_version = 1.00
+    auto_reconnect = True
     _device = None
     _connected = False
+    _stream = None
+    _reconnect_count = 0
 
     def get_serial_numbers():
         '''Get the serial numbers of the attached wheels'''
-        devs = hid.enumerate(0x10c4, 0x82cd)
+        devs = hid.enumerate(VENDOR_ID, PRODUCT_ID)
         sns = []
         for dev in devs:
             sns.append(dev['serial_number'])
@@ -31,18 +139,55 @@ class HSFW:
 
         if self._device is None:
             self._device = hid.device()
-            self._device.open(0x10c4, 0x82cd, self.serial_number)
+            self._device.open(VENDOR_ID, PRODUCT_ID, self.serial_number)
 
-        _connected = True
+        self._connected = True
         self._get_firmware_version()
 
     def close(self):
         '''Closes and releases the connection to the HSFW'''
+        if self._stream is not None:
+            self._stream.stop()
+            self._stream = None
+
         if self._device is not None:
             self._device.close()
             self._device = None
 
-        _connected = False
+        self._connected = False
+
+    def _reconnect(self):
+        '''
+        Reopens the HSFW by serial number after the USB connection was lost.
+        The cached firmware version is kept instead of being read again.
+        '''
+        if self._device is not None:
+            try:
+                self._device.close()
+            except (OSError, ValueError):
+                pass
+            self._device = None
+
+        device = hid.device()
+        device.open(VENDOR_ID, PRODUCT_ID, self.serial_number)
+        self._device = device
+        self._reconnect_count += 1
+
+    def _with_reconnect(self, operation, *args):
+        '''
+        Runs an idempotent read, reconnecting and retrying once if the USB connection was lost.
+        hidapi reports a closed device with ValueError, so operations must not raise ValueError for other reasons.
+        '''
+        with self._io_lock:
+            if self._device is None and self._connected and self.auto_reconnect:
+                self._reconnect()
+            try:
+                return operation(*args)
+            except (OSError, ValueError):
+                if not self.auto_reconnect or not self._connected:
+                    raise
+                self._reconnect()
+                return operation(*args)
 
     def _getIsHomed(self):
         '''Returns true if the HSFW is homed. Use the is_homed property.'''
@@ -113,25 +258,17 @@ class HSFW:
 
     def __init__(self, serial_number):
         self.serial_number = serial_number
+        self._io_lock = threading.RLock()
         self.open()
 
     def get_hsfw_status(self):
         '''Returns the raw status data for the wheel.'''
-        res = self._device.get_input_report(10, 8)
-
-        status = {
-            "report_id": res[0],
-            "is_homed": res[1] == REPORT_TRUE,
-            "is_homing": res[2] == REPORT_TRUE,
-            "is_moving": res[3] == REPORT_TRUE,
-            "position": res[4],
-            "error_state": res[5]
-        }
-        return status
+        res = self._with_reconnect(self._read_input_report, STATUS_REPORT_ID, 8)
+        return _parse_status(res)
 
     def get_hsfw_description(self):
         '''Returns the raw description data for the wheel.'''
-        res = self._device.get_input_report(11, 8)
+        res = self._with_reconnect(self._read_input_report, 11, 8)
 
         status = {
             "report_id": res[0],
@@ -144,6 +281,66 @@ class HSFW:
         }
         return status
 
+    def _read_input_report(self, report_id, length):
+        return self._device.get_input_report(report_id, length)
+
+    def _transact(self, report, *values):
+        '''
+        Sends a feature report, reads both responses and validates them against the report description.
+        Returns the second response.
+        '''
+        request = report.encode(*values)
+        with self._io_lock:
+            if self._device.send_feature_report(request) <= 0:
+                raise HSFWReportError(report, "the report could not be sent")
+            first = self._device.get_feature_report(report.report_id, FEATURE_REPORT_LENGTH)
+            second = self._device.get_feature_report(report.report_id, FEATURE_REPORT_LENGTH)
+        report.validate(request, first, second)
+        return second
+
+    def _read_pushed_report(self):
+        self._device.set_nonblocking(1)
+        return self._device.read(8)
+
+    def _read_pushed_status(self):
+        '''Returns a status report pushed by the HSFW, or None if nothing is waiting. Reconnects if the USB connection was lost.'''
+        res = self._with_reconnect(self._read_pushed_report)
+        if not res or res[0] != STATUS_REPORT_ID:
+            return None
+        return _parse_status(res)
+
+    def subscribe(self, callback):
+        '''
+        Calls callback(event) from a background thread whenever position, homed, homing, moving or error_state changes
+        after the subscription starts.
+        An event is the status dict with an added "timestamp" (time.time()).
+        '''
+        if self._stream is None:
+            self._stream = HSFWStatusStream(self)
+        self._stream.subscribe(callback)
+        return callback
+
+    def unsubscribe(self, callback):
+        '''Stops calling a callback passed to subscribe().'''
+        if self._stream is not None:
+            self._stream.unsubscribe(callback)
+
+    def status_events(self, timeout=None):
+        '''
+        Yields status change events as they happen.
+        Stops after timeout seconds without a change, or runs until the caller stops iterating if timeout is None.
+        '''
+        events = queue.Queue()
+        self.subscribe(events.put)
+        try:
+            while True:
+                try:
+                    yield events.get(timeout=timeout)
+                except queue.Empty:
+                    return
+        finally:
+            self.unsubscribe(events.put)
+
     def home(self):
         '''
         Homes the Wheel. 
@@ -152,28 +349,7 @@ class HSFW:
         if self.error_state != 0:
             self.clear_error()
 
-        report_id = 21
-        report = [report_id, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0]
-        if self._device.send_feature_report(report) == 0:
-            raise Exception("Failed to home")
-
-        res = self._device.get_feature_report(report_id, 14)
-        if res == 0:
-            raise Exception("Failed to home")
-
-        if res[0] != report_id:
-            raise Exception("Failed to home")
-
-        home_resp = res[1]
-
-        res = self._device.get_feature_report(report_id, 14)
-        if res == 0:
-            raise Exception("Failed to home")
-
-        error_resp = res[1]
-
-        if error_resp != REPORT_FALSE or home_resp != REPORT_TRUE:
-            raise Exception("Failed to home")
+        self._transact(HOME_REPORT)
 
     def move_to_filter(self, position):
         '''
@@ -186,28 +362,7 @@ class HSFW:
             raise Exception("{} is out of range. It must be between 1 and {}".format(
                 position, description['filter_count']))
 
-        report_id = 20
-        report = [report_id, position, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0]
-        if self._device.send_feature_report(report) == 0:
-            raise Exception("Failed to move")
-
-        res = self._device.get_feature_report(report_id, 14)
-        if res == 0:
-            raise Exception("Failed to move")
-
-        if res[0] != report_id:
-            raise Exception("Failed to move")
-
-        move_resp = res[1]
-
-        res = self._device.get_feature_report(report_id, 14)
-        if res == 0:
-            raise Exception("Failed to move")
-
-        error_resp = res[1]
-
-        if error_resp != REPORT_FALSE or move_resp != REPORT_TRUE:
-            raise Exception("Failed to move")
+        self._transact(MOVE_REPORT, position)
 
     def number_of_filters(self):
         '''Returns the number of filters on the current Wheel.'''
@@ -219,36 +374,16 @@ class HSFW:
 
     def clear_error(self):
         '''Clears any error set in the wheel.'''
-        self._device.write([2, 0])
+        with self._io_lock:
+            self._device.write([2, 0])
 
     def get_wheel_name(self, wheel_id = None):
         '''Returns the current wheel name.'''
         if wheel_id is None:
             wheel_id = self.get_wheel_id()
 
-
-        flash_read_wheel_name = 5
-        name_report = [22, flash_read_wheel_name, ord(wheel_id), 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0] 
-        if self._device.send_feature_report(name_report) == 0:
-            raise Exception("Failed to get wheel name")
-        
-        resp1 = self._device.get_feature_report(22, 14)
-
-        resp2 = self._device.get_feature_report(22, 14)
-
-        if resp1[1] != resp2[1] or resp1[1] != flash_read_wheel_name:
-            raise Exception("Failed to get wheel name")
-
-        if resp1[2] != resp2[2] or resp1[2] != 0:
-            raise Exception("Failed to get wheel name")
-
-        if resp1[3] != resp2[3] or resp1[3] != ord(wheel_id):
-            raise Exception("Failed to get wheel name")
-
-        if resp1[4] != resp2[4] or resp1[4] != 0:
-            raise Exception("Failed to get wheel name")
-
-        return  bytes(resp2[6:]).decode('utf-8')
+        res = self._with_reconnect(self._transact, READ_WHEEL_NAME_REPORT, ord(wheel_id))
+        return bytes(res[6:]).decode('utf-8')
 
     def get_wheel_names(self):
         '''Returns all wheel names'''
@@ -267,28 +402,8 @@ class HSFW:
         if position is None:
             position = self.get_current_filter()
 
-        flash_read_wheel_name = 3
-        name_report = [22, flash_read_wheel_name, ord(wheel_id), position, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0] 
-        if self._device.send_feature_report(name_report) == 0:
-            raise Exception("Failed to get filter name")
-        
-        resp1 = self._device.get_feature_report(22, 14)
-
-        resp2 = self._device.get_feature_report(22, 14)
-
-        if resp1[1] != resp2[1] or resp1[1] != flash_read_wheel_name:
-            raise Exception("Failed to get filter name")
-
-        if resp1[2] != resp2[2] or resp1[2] != 0:
-            raise Exception("Failed to get filter name")
-
-        if resp1[3] != resp2[3] or resp1[3] != ord(wheel_id):
-            raise Exception("Failed to get filter name")
-
-        if resp1[4] != resp2[4] or resp1[4] != position:
-            raise Exception("Failed to get filter name")
-
-        return  bytes(resp2[6:]).decode('utf-8')
+        res = self._with_reconnect(self._transact, READ_FILTER_NAME_REPORT, ord(wheel_id), position)
+        return bytes(res[6:]).decode('utf-8')
 
     def get_filter_names(self, wheel_id=None):
         '''Returns all names for the current wheel or the specified wheel.'''
@@ -359,32 +474,132 @@ class HSFW:
         if len(name) > 8:
             raise Exception("Names must be less then 8 characters")
 
-        flash_update_filter_name = 2
-        flashops_command = 22
-
-        name = name.ljust(8, ' ')
-
-        data = [flashops_command, flash_update_filter_name, ord(wheel_id), position, ord(name[0]), ord(name[1]), ord(name[2]), ord(name[3]), ord(name[4]), ord(name[5]), ord(name[6]), ord(name[7]), 0, 0]
-
-        if self._device.send_feature_report(data) == 0:
-            raise Exception("Failed to set filter name")
-        
-        resp1 = self._device.get_feature_report(22, 14)
-
-        resp2 = self._device.get_feature_report(22, 14)
-
-        if resp1[1] != resp2[1] or resp1[1] != flash_update_filter_name:
-            raise Exception("Failed to set filter name")
+        self._transact(UPDATE_FILTER_NAME_REPORT, ord(wheel_id), position, name.ljust(8, ' ').encode('latin-1'))
 
-        if resp1[2] != resp2[2] or resp1[2] != 0:
-            raise Exception("Failed to set filter name")
-
-        if resp1[3] != resp2[3] or resp1[3] != ord(wheel_id):
-            raise Exception("Failed to set filter name")
+    def _check_valid_wheel_id(self, wheel_id):
+        return wheel_id in 'ABCDEFGHIJK'
 
-        if resp1[4] != resp2[4] or resp1[4] != position:
-            raise Exception("Failed to set filter name")
 
+class HSFWStatusStream:
+    '''
+    Background reader that publishes HSFW status changes to subscribers.
+
+    Status reports pushed by the wheel on the interrupt endpoint are read in non-blocking mode.
+    If the wheel has not pushed anything, the status is polled every poll_interval seconds instead.
+    Once pushes are seen, polling drops to every keepalive_interval seconds to catch missed reports.
+    The stream starts with the first subscriber and stops when the last one unsubscribes.
+    Each start uses a new reader thread with its own stop event, so a stopped reader never resumes.
+    When a reader starts, reports queued since the wheel was opened are discarded and only later changes are published.
+    last_error holds the most recent exception from reading the wheel or from a subscriber callback.
+    '''
 
-    def _check_valid_wheel_id(self, wheel_id):
-        return wheel_id in 'ABCDEFGHIJK'
+    def __init__(self, wheel, read_interval=0.005, poll_interval=0.25, keepalive_interval=2.0):
+        self.wheel = wheel
+        self.read_interval = read_interval
+        self.poll_interval = poll_interval
+        self.keepalive_interval = keepalive_interval
+        self.is_pushing = False
+        self.last_error = None
+        self._subscribers = []
+        self._last_status = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def subscribe(self, callback):
+        with self._lock:
+            self._subscribers.append(callback)
+            if self._thread is None:
+                self._stop = threading.Event()
+                self._last_status = None
+                self._thread = threading.Thread(target=self._run, args=(self._stop,), name="HSFWStatusStream", daemon=True)
+                self._thread.start()
+
+    def unsubscribe(self, callback):
+        with self._lock:
+            if callback in self._subscribers:
+                self._subscribers.remove(callback)
+            if self._subscribers:
+                return
+            thread = self._detach()
+        self._join(thread)
+
+    def stop(self):
+        with self._lock:
+            thread = self._detach()
+        self._join(thread)
+
+    def _detach(self):
+        '''Signals the reader thread to stop and forgets it, so the next subscribe() starts a new one. Call with _lock held.'''
+        self._stop.set()
+        thread = self._thread
+        self._thread = None
+        return thread
+
+    def _join(self, thread):
+        if thread is not None and thread is not threading.current_thread():
+            thread.join()
+
+    def _start_baseline(self, stop):
+        '''
+        Discards reports the wheel pushed before the reader started and takes the current status as the baseline,
+        so that stale state changes are not published as new events.
+        '''
+        for i in range(1000):
+            if stop.is_set() or self.wheel._read_pushed_status() is None:
+                break
+        self._last_status = self.wheel.get_hsfw_status()
+
+    def _run(self, stop):
+        last_poll = time.monotonic()
+        reconnect_count = self.wheel._reconnect_count
+        while not stop.is_set():
+            try:
+                self._start_baseline(stop)
+                break
+            except Exception as e:
+                self.last_error = e
+                stop.wait(self.poll_interval)
+
+        while not stop.is_set():
+            status = None
+            try:
+                status = self.wheel._read_pushed_status()
+                if self.wheel._reconnect_count != reconnect_count:
+                    reconnect_count = self.wheel._reconnect_count
+                    self.is_pushing = False
+                if status is not None:
+                    self.is_pushing = True
+                    last_poll = time.monotonic()
+                else:
+                    interval = self.keepalive_interval if self.is_pushing else self.poll_interval
+                    if time.monotonic() - last_poll >= interval:
+                        last_poll = time.monotonic()
+                        status = self.wheel.get_hsfw_status()
+            except Exception as e:
+                self.last_error = e
+                self.is_pushing = False
+                stop.wait(self.poll_interval)
+                continue
+
+            if status is not None and not stop.is_set():
+                self._publish(status)
+            else:
+                stop.wait(self.read_interval)
+
+    def _publish(self, status):
+        previous = self._last_status
+        if previous is not None and all(previous[key] == status[key] for key in STATUS_EVENT_KEYS):
+            return
+        self._last_status = status
+
+        event = dict(status)
+        event["timestamp"] = time.time()
+
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for callback in subscribers:
+            try:
+                callback(event)
+            except Exception as e:
+                self.last_error = e
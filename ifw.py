@@ -1,7 +1,14 @@
 import serial
 import serial.tools.list_ports
+import time
 from enum import Enum
 
+from fw_timing import OperationTimings
+
+
+class IFWConnectionLost(Exception):
+    '''Raised when the connection drops during a home or move. The port has been reopened but the command was not resent.'''
+
 
 class IFW_Model(Enum):
     IFW = 0
@@ -15,6 +22,9 @@ class IFW:
 
     Requires the COM port of the wheel to function.
     open() can be used to open or change the COM port and must be called before using the wheel.
+    If the serial connection drops, the port is reopened (found again by its USB serial number if it moved)
+    and the wheel ID, position and name reads are retried. A home or move interrupted by the drop raises
+    IFWConnectionLost after the port is reopened, without resending the command. Set auto_reconnect to False to disable this.
     '''
     wheel_id = 'A'
     firmware_version = 1.00
@@ -23,13 +33,21 @@ class IFW:
     is_homing = False
     is_moving = False
     filter_names = []
+    auto_reconnect = True
     _ser = None
     _connected = False
+    _usb_serial_number = None
+    _position = None
 
     model = IFW_Model.Unknown
 
-    def __init__(self, port):
+    def __init__(self, port, timings=None):
+        '''
+        timings is an OperationTimings used to derive home and move timeouts from past runs.
+        By default they are kept in memory. Pass OperationTimings(fw_timing.DEFAULT_TIMINGS_FILE) to keep them across restarts.
+        '''
         self.port = port
+        self.timings = timings if timings is not None else OperationTimings()
         self.open()
 
     def __read_write(self, command, timeout=.5):
@@ -75,14 +93,88 @@ class IFW:
         else:
             return res
 
+    def _default_timeout(self):
+        if self.firmware_version >= 4.0:
+            return 7
+        return 30
+
+    def _timing_key(self):
+        if self.serial_number != '****':
+            return "IFW:{}".format(self.serial_number)
+        return "IFW:{}".format(self.port)
+
+    def __timed_read_write(self, command, operation, timeout, units=1):
+        '''
+        Sends a home or move command and waits up to timeout for the reply.
+        Records the duration on success and returns None if the wheel did not answer in time.
+        '''
+        start = time.monotonic()
+        res = self.__read_write(command, timeout)
+        duration = time.monotonic() - start
+
+        if not res.strip():
+            self._position = None
+            return None
+
+        self.timings.record(self._timing_key(), operation, duration, units)
+        return res
+
+    def __command(self, command, operation, timeout, units=1):
+        '''
+        Sends a home or move command, reopening the port first if an earlier reconnect failed.
+        If the connection drops, the port is reopened without resending the command and IFWConnectionLost is raised,
+        as the wheel may already have acted on it.
+        '''
+        if self._ser is None and self.auto_reconnect and self._connected:
+            self._reconnect()
+        try:
+            return self.__timed_read_write(command, operation, timeout, units)
+        except serial.SerialTimeoutException:
+            raise
+        except (serial.SerialException, OSError):
+            if not self.auto_reconnect or not self._connected:
+                raise
+            self._reconnect()
+            raise IFWConnectionLost(
+                "The connection to the IFW was lost during the {operation} and has been reopened. Retry the {operation}.".format(
+                    operation=operation))
+
+    def _timeout_message(self, operation, timeout):
+        if timeout < self._default_timeout():
+            return "The Wheel did not finish the {operation} within {timeout:.2f}s. The wheel may be stuck or slipping.".format(
+                operation=operation, timeout=timeout)
+        return "Timed out during a {operation}".format(operation=operation)
+
+    def _home_timeout(self):
+        '''
+        The slower of the slowest recorded home and, once moves have been recorded,
+        a full revolution at the slowest recorded move speed.
+        '''
+        key = self._timing_key()
+        default = self._default_timeout()
+        timeout = self.timings.timeout(key, "home", default)
+        if self.timings.expected(key, "move") is not None:
+            timeout = max(timeout, self.timings.timeout(key, "move", default, self.number_of_filters()))
+        return timeout
+
+    def _move_slots(self, position):
+        '''Returns the shortest and longest number of slots between the current position and position.'''
+        if self._position is None:
+            self.get_current_filter()
+        count = self.number_of_filters()
+        distance = (position - self._position) % count
+        return min(distance, count - distance), max(distance, count - distance)
+
     def open(self, port=None):
         '''Opens the IFW on the specified COM Port. This must be called before the IFW can be used.'''
         if port is not None:
             self.port = port
 
-        if len([port for port in serial.tools.list_ports.comports() if self.port in port]) < 1:
+        ports = [port for port in serial.tools.list_ports.comports() if self.port in port]
+        if len(ports) < 1:
             raise Exception(
                 "Port {port} is not attached to the system.".format(port=self.port))
+        self._usb_serial_number = getattr(ports[0], 'serial_number', None)
 
         if self._ser is None:
             self._ser = serial.Serial(self.port, 19200, timeout=.5)
@@ -110,29 +202,88 @@ class IFW:
     def close(self):
         '''Closes and releases the connection to the IFW'''
         self._connected = False
-        self._ser.write(bytes("WEXITS", 'utf-8'))
+        self.timings.flush()
+        if self._ser is None:
+            return
+        try:
+            self._ser.write(bytes("WEXITS", 'utf-8'))
+        except (serial.SerialException, OSError):
+            pass
         self._ser.close()
         self._ser = None
 
+    def _find_port(self):
+        ports = serial.tools.list_ports.comports()
+        if self._usb_serial_number:
+            for port in ports:
+                if getattr(port, 'serial_number', None) == self._usb_serial_number:
+                    return port.device
+        if len([port for port in ports if self.port in port]) < 1:
+            raise Exception(
+                "Port {port} is not attached to the system.".format(port=self.port))
+        return self.port
+
+    def _reconnect(self):
+        '''
+        Reopens the IFW after the serial connection was lost.
+        The cached wheel ID, firmware version, model, serial number and names are kept instead of being read again.
+        '''
+        if self._ser is not None:
+            try:
+                self._ser.close()
+            except (serial.SerialException, OSError):
+                pass
+            self._ser = None
+
+        self.port = self._find_port()
+        self._ser = serial.Serial(self.port, 19200, timeout=.5)
+
+        if not b'!' in self.__read_write("WSMODE"):
+            raise Exception(
+                "Timed out waiting for response from IFW on port {sport}".format(sport=self.port))
+
+    def __query(self, command):
+        '''Sends an idempotent read, reconnecting and retrying once if the serial connection was lost.'''
+        try:
+            if self._ser is None:
+                raise serial.SerialException("The serial port is closed")
+            return self.__read_write(command)
+        except (serial.SerialException, OSError):
+            if not self.auto_reconnect or not self._connected:
+                raise
+            self._reconnect()
+            return self.__read_write(command)
+
     def home(self):
         '''
         Homes the Wheel. 
         Make sure to monitor is_homing to block until the home is complete.
         '''
         self._assert_connected()
+        was_homed = self.is_homed
         self.is_homed = False
         self.is_homing = True
         self.is_moving = True
-        timeout = 30
-        if self.firmware_version >= 4.0:
-            timeout = 7
+        timeout = self._home_timeout()
         try:
-            self.wheel_id = self.__read_write("WHOMES", timeout).strip().decode("utf-8")
+            res = self.__command("WHOMES", "home", timeout)
+            if res is None:
+                raise Exception(self._timeout_message("home", timeout))
+            self.wheel_id = res.strip().decode("utf-8")
         except serial.SerialTimeoutException:
             self.is_homing = False
             self.is_homed = False
             self.is_moving = False
             raise Exception("Timed out during a home")
+        except IFWConnectionLost:
+            self.is_homed = was_homed
+            self.is_homing = False
+            self.is_moving = False
+            raise
+        except Exception:
+            self.is_homing = False
+            self.is_moving = False
+            raise
         self.is_homed = True
         self.is_homing = False
         self.is_moving = False
@@ -157,14 +308,14 @@ class IFW:
         if not self.is_homed:
             return
 
+        shortest, longest = self._move_slots(position)
+        timeout = self.timings.timeout(self._timing_key(), "move", self._default_timeout(), longest)
+
         self.is_moving = True
 
-        timeout = 30
-        if self.firmware_version >= 4.0:
-            timeout = 7
         try:
-            done = self.__read_write(
-                "WGxxx{}".format(position), timeout).strip()
+            done = self.__command(
+                "WGxxx{}".format(position), "move", timeout, shortest)
         except serial.SerialTimeoutException:
             self.is_moving = False
             raise Exception("Timed out during a home")
@@ -173,18 +324,37 @@ class IFW:
 
         self.is_moving = False
 
+        if done is None:
+            current = self._confirm_position()
+            if current is None:
+                raise Exception(self._timeout_message("move", timeout) + " The wheel did not answer and may still be moving.")
+            if current != position:
+                self.is_homed = False
+                raise Exception(self._timeout_message("move", timeout) + " The wheel stopped at filter {}.".format(current))
+            return
+
+        self._position = position
+
+    def _confirm_position(self):
+        '''Asks the wheel for its position after a move did not answer in time. Returns None if it still doesn't answer.'''
+        try:
+            return self.get_current_filter()
+        except (ValueError, serial.SerialException, OSError):
+            return None
+
     def get_wheel_id(self):
         '''Returns the Wheel ID (A-K) of the current Wheel'''
         self._assert_connected()
-        res = self.__read_write("WIDENT")
+        res = self.__query("WIDENT")
         self.wheel_id = res.strip().decode("utf-8")
         return self.wheel_id
 
     def get_current_filter(self):
         '''Returns the current position of the Wheel.'''
         self._assert_connected()
-        res = self.__read_write("WFxxxx")
-        return int(res)
+        res = self.__query("WFxxxx")
+        self._position = int(res)
+        return self._position
 
     def _get_firmware_version(self):
         self._assert_connected()
@@ -212,14 +382,14 @@ class IFW:
         self.serial_number = '****'
 
     def _assert_connected(self):
-        if not self._connected and self.ser is not None and self.ser.is_open:
+        if not self._connected:
             raise Exception(
                 "The IFW must be connected to perform this operation")
 
     def get_filter_names(self):
         '''Returns all names for the current wheel.'''
         self._assert_connected()
-        res = self.__read_write("WRxxxx")
+        res = self.__query("WRxxxx")
         if self.model is IFW_Model.Unknown:
             self._detect_model_from_names(len(res))
 
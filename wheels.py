@@ -0,0 +1,148 @@
+import importlib
+
+
+class WheelBackend:
+    '''
+    Describes how to find and open one type of filter wheel.
+
+    opener(identifier, **kwargs) returns an opened wheel.
+    lister() returns the identifiers of the attached wheels.
+    detector(identifier) returns True if this backend can open the identifier. By default the identifier is looked up in lister().
+    '''
+
+    def __init__(self, name, opener, lister=None, detector=None):
+        self.name = name
+        self.open = opener
+        self.list = lister if lister is not None else (lambda: [])
+        self.detect = detector if detector is not None else (lambda identifier: identifier in self.list())
+
+
+_backends = {}
+
+
+def register_backend(name, opener, lister=None, detector=None):
+    '''
+    Registers a wheel backend, for example a simulator or a remote proxy.
+    Backends are tried in registration order when detecting the wheel type.
+    '''
+    backend = WheelBackend(name, opener, lister, detector)
+    _backends[name] = backend
+    return backend
+
+
+def unregister_backend(name):
+    '''Removes a registered wheel backend.'''
+    _backends.pop(name, None)
+
+
+def get_backends():
+    '''Returns the names of the registered backends.'''
+    return [name for name in _backends]
+
+
+def list_wheels():
+    '''
+    Returns (backend, identifier) pairs for the attached wheels.
+    Backends whose library is not installed are skipped. IFW identifiers are all serial ports, as they can't be told apart without opening them.
+    '''
+    found = []
+    for backend in _backends.values():
+        try:
+            identifiers = backend.list()
+        except ImportError:
+            continue
+        for identifier in identifiers:
+            found.append((backend.name, identifier))
+    return found
+
+
+def detect_backend(identifier):
+    '''Returns the name of the backend that can open the serial number or port.'''
+    for backend in _backends.values():
+        try:
+            if backend.detect(identifier):
+                return backend.name
+        except ImportError:
+            continue
+    raise Exception("No attached filter wheel matches {}".format(identifier))
+
+
+def resolve_wheel(identifier, backend=None):
+    '''
+    Returns (backend, identifier) with the identifier in the form the backend opens, so different names for the
+    same wheel compare equal. For example an IFW given by the USB serial number of its port resolves to the port.
+    '''
+    if backend is None:
+        backend = detect_backend(identifier)
+    if backend == 'ifw':
+        identifier = _find_ifw_port(identifier) or identifier
+    return backend, identifier
+
+
+def open_wheel(identifier, backend=None, **kwargs):
+    '''
+    Opens the wheel with the given serial number or COM port and returns it.
+    Only the library for the detected wheel type is imported.
+    The backend ("hsfw", "ifw" or a registered name) is detected when not given. Extra arguments are passed to the wheel class.
+    timings, an fw_timing.OperationTimings, is used by the IFW for its home and move timeouts and ignored by the HSFW.
+    '''
+    if backend is None:
+        backend = detect_backend(identifier)
+    if backend not in _backends:
+        raise Exception("Unknown filter wheel backend {}. Available backends: {}".format(backend, ", ".join(get_backends())))
+    return _backends[backend].open(identifier, **kwargs)
+
+
+def _looks_like_port(identifier):
+    identifier = str(identifier)
+    return identifier.upper().startswith('COM') or identifier.startswith('/dev/')
+
+
+def _open_hsfw(serial_number, timings=None, **kwargs):
+    hsfw = importlib.import_module('hsfw')
+    return hsfw.HSFW(serial_number, **kwargs)
+
+
+def _list_hsfw():
+    hsfw = importlib.import_module('hsfw')
+    return hsfw.HSFW.get_serial_numbers()
+
+
+def _detect_hsfw(identifier):
+    if _looks_like_port(identifier):
+        return False
+    return identifier in _list_hsfw()
+
+
+def _serial_ports():
+    list_ports = importlib.import_module('serial.tools.list_ports')
+    return list_ports.comports()
+
+
+def _find_ifw_port(identifier):
+    for port in _serial_ports():
+        if identifier == port.device or identifier == getattr(port, 'serial_number', None):
+            return port.device
+    return None
+
+
+def _open_ifw(identifier, **kwargs):
+    ifw = importlib.import_module('ifw')
+    port = identifier
+    if not _looks_like_port(identifier):
+        port = _find_ifw_port(identifier) or identifier
+    return ifw.IFW(port, **kwargs)
+
+
+def _list_ifw():
+    return [port.device for port in _serial_ports()]
+
+
+def _detect_ifw(identifier):
+    if _looks_like_port(identifier):
+        return True
+    return _find_ifw_port(identifier) is not None
+
+
+register_backend('hsfw', _open_hsfw, _list_hsfw, _detect_hsfw)
+register_backend('ifw', _open_ifw, _list_ifw, _detect_ifw)